@@ -1,5 +1,11 @@
-import json
-from datasets import Dataset
+import itertools
+import ijson
+import numpy as np
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from datasets import ClassLabel, Dataset, Features, Sequence, Value
 
 # Mapeamento de labels para IDs
 LABEL_TO_ID = {
@@ -14,76 +20,121 @@ LABEL_TO_ID = {
     "valor_total_bens": 8
 }
 
-def convert_label_studio_to_hf(json_path):
+# Labels e IDs de LABEL_TO_ID como arrays Arrow, para o mapeamento vetorizado
+LABEL_NAMES = pa.array(list(LABEL_TO_ID.keys()), pa.string())
+LABEL_IDS = pa.array(list(LABEL_TO_ID.values()), pa.int64())
+
+# Campos lidos do JSON exportado do Label Studio (os demais são ignorados)
+LABEL_STUDIO_TYPE = pa.struct([
+    ("id", pa.int64()),
+    ("ocr", pa.string()),
+    ("transcription", pa.list_(pa.string())),
+    ("label", pa.list_(pa.struct([
+        ("x", pa.float64()),
+        ("y", pa.float64()),
+        ("width", pa.float64()),
+        ("height", pa.float64()),
+        ("labels", pa.list_(pa.string())),
+    ]))),
+])
+
+# Tipos das colunas do Dataset do Hugging Face. Declarar bboxes com tamanho
+# fixo e ner_tags como ClassLabel evita a inferência de tipos e permite ler
+# as colunas como tensores sem cópia (ex: with_format("torch"))
+HF_FEATURES = Features({
+    "id": Value("int64"),
+    "image": Value("string"),
+    "tokens": Sequence(Value("string")),
+    "bboxes": Sequence(Sequence(Value("float32"), length=4)),
+    "ner_tags": Sequence(ClassLabel(names=sorted(LABEL_TO_ID, key=LABEL_TO_ID.get))),
+})
+
+# Linhas por row group ao gravar em Parquet. Row groups grandes amortizam o
+# custo fixo de cada grupo na escrita e na leitura; como cada linha é uma
+# página inteira (dezenas de bboxes e tokens), 8192 linhas ainda cabem
+# confortavelmente em memória
+PARQUET_BATCH_SIZE = 8192
+
+def take_first_values(list_array, lengths):
+    """
+    Mantém apenas os primeiros lengths[i] valores de cada lista da ListArray.
+    Retorna os offsets das novas listas e os valores selecionados, concatenados.
+    """
+    old_offsets = list_array.offsets.to_numpy()[:-1]
+    new_offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    # Posição de cada valor mantido dentro de list_array.values
+    indices = np.repeat(old_offsets - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+
+    return pa.array(new_offsets, pa.int32()), list_array.values.take(pa.array(indices))
+
+def build_hf_table(data):
+    """
+    Converte uma lista de exemplos do Label Studio em uma tabela Arrow
+    no schema de HF_FEATURES.
+    """
+
+    # Converte todos os exemplos de uma vez para o formato Arrow
+    samples = pa.array(data, type=LABEL_STUDIO_TYPE)
+    labels = samples.field("label")
+    tokens = samples.field("transcription")
+
+    # Cada item de "label" corresponde a um item de "transcription".
+    # Se as quantidades forem diferentes, usamos a menor das duas (como zip())
+    lengths = np.minimum(
+        pc.list_value_length(labels).fill_null(0).to_numpy(),
+        pc.list_value_length(tokens).fill_null(0).to_numpy(),
+    )
+    offsets, regions = take_first_values(labels, lengths)
+
+    # Monta a lista [x, y, width, height] de cada bounding box, preenchendo
+    # direto o array float32 final, uma coluna por vez
+    boxes = np.empty((len(regions), 4), dtype=np.float32)
+    for column, name in enumerate(("x", "y", "width", "height")):
+        boxes[:, column] = regions.field(name).to_numpy(zero_copy_only=False)
+    bboxes = pa.ListArray.from_arrays(
+        offsets, pa.FixedSizeListArray.from_arrays(pa.array(boxes.ravel()), 4)
+    )
+
+    # Label (primeira da lista) convertida para ID numérico, em uma única
+    # passada vetorizada: index_in encontra a posição de cada label em
+    # LABEL_TO_ID (nula se não existir) e take troca a posição pelo ID
+    label_names = pc.list_element(regions.field("labels"), 0)
+    label_positions = pc.index_in(label_names, value_set=LABEL_NAMES)
+    label_ids = pc.take(LABEL_IDS, label_positions).fill_null(-1)  # -1 para rótulos não mapeados
+    ner_tags = pa.ListArray.from_arrays(offsets, label_ids)
+
+    # Monta a tabela no formato aceito pelo Hugging Face. Os metadados do
+    # schema carregam as Features (incluindo os nomes das classes)
+    return pa.Table.from_arrays(
+        [samples.field("id"), samples.field("ocr"), tokens, bboxes, ner_tags],
+        schema=HF_FEATURES.arrow_schema,
+    )
+
+def convert_label_studio_to_hf(json_path, stream=False):
     """
     Lê o JSON exportado do Label Studio, ignorando o campo "bbox".
     Pega as informações de bounding box e label diretamente de "label".
     Converte para um Dataset do Hugging Face.
+
+    Com stream=True, os exemplos são lidos com ijson em lotes de
+    PARQUET_BATCH_SIZE, sem carregar o arquivo inteiro na memória
+    (útil para exportações muito grandes).
     """
 
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    all_ids = []
-    all_images = []
-    all_tokens = []
-    all_bboxes = []
-    all_ner_tags = []
-
-    for item in data:
-        # ID do exemplo
-        sample_id = item["id"]
-
-        # Caminho ou URL da imagem (campo 'ocr')
-        sample_image = item["ocr"]
-
-        # Lista de "tokens" (assumindo que cada item da 'transcription'
-        # corresponde a um item de 'label')
-        tokens = item["transcription"]
-
-        # As bounding boxes e as tags, agora extraídas SÓ do campo "label"
-        bboxes = []
-        ner_tags = []
-
-        # Verifique se a quantidade de "label" é a mesma de "transcription".
-        # Se não for, você pode usar zip() ou min(len(), len()).
-        # Aqui, vamos usar zip() para tratar a menor das duas:
-        for label_info, token_text in zip(item["label"], tokens):
-            # Pegamos os campos de bbox diretamente do label_info
-            x = label_info["x"]
-            y = label_info["y"]
-            w = label_info["width"]
-            h = label_info["height"]
-
-            # Monta a lista [x, y, width, height] - ou qualquer formato
-            bboxes.append([x, y, w, h])
-
-            # label_info["labels"] normalmente é uma lista de classes
-            # Se há só uma classe por bounding box, pegamos a primeira
-
-            # Label (primeira da lista) convertida para ID numérico
-            label_name = label_info["labels"][0]
-            label_id = LABEL_TO_ID.get(label_name, -1)  # -1 para rótulos não mapeados
-            ner_tags.append(label_id)
-            # class_id = label_info["labels"][0]
-            # ner_tags.append(class_id)
-
-        all_ids.append(sample_id)
-        all_images.append(sample_image)
-        all_tokens.append(tokens)
-        all_bboxes.append(bboxes)
-        all_ner_tags.append(ner_tags)
-
-    # Monta o dicionário no formato aceito pelo Hugging Face
-    hf_dict = {
-        "id": all_ids,
-        "image": all_images,
-        "tokens": all_tokens,
-        "bboxes": all_bboxes,
-        "ner_tags": all_ner_tags,
-    }
-
-    hf_dataset = Dataset.from_dict(hf_dict)
+    if stream:
+        with open(json_path, "rb") as f:
+            items = ijson.items(f, "item", use_float=True)
+            tables = []
+            while batch := list(itertools.islice(items, PARQUET_BATCH_SIZE)):
+                tables.append(build_hf_table(batch))
+        hf_table = pa.concat_tables(tables) if tables else build_hf_table([])
+    else:
+        with open(json_path, "rb") as f:
+            data = orjson.loads(f.read())
+        hf_table = build_hf_table(data)
+
+    hf_dataset = Dataset(hf_table)
     return hf_dataset
 
 if __name__ == "__main__":
@@ -92,5 +143,14 @@ if __name__ == "__main__":
     hf_dataset = convert_label_studio_to_hf(json_file)
 
     print(hf_dataset)
-    # Salvar no formato Arrow, se quiser
-    hf_dataset.save_to_disk("arrow_dataset")
\ No newline at end of file
+    # Salvar em Parquet, com row groups de PARQUET_BATCH_SIZE linhas.
+    # Para ler em lotes no treinamento:
+    #   pyarrow.parquet.ParquetFile("dataset.parquet").iter_batches(batch_size=PARQUET_BATCH_SIZE)
+    pq.write_table(
+        hf_dataset.data.table,
+        "dataset.parquet",
+        row_group_size=PARQUET_BATCH_SIZE,
+        use_dictionary=True,
+        compression="zstd",
+        compression_level=3,
+    )
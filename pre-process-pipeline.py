@@ -17,52 +17,195 @@ Usage:
 Dependencies:
     - PyMuPDF (fitz)
     - PaddleOCR
-    - PIL
+    - OpenCV (cv2)
     - numpy
+    - orjson
 """
 
 import pymupdf as fitz
 import os
 import sys
-import json
-from uuid import uuid4
+import orjson
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+import itertools
 import numpy as np
-from PIL import Image
-from paddleocr import PaddleOCR
+import cv2
 import glob
 
-def convert_pdf_to_images(pdf_path, dpi=300):
+# PyMuPDF holds the GIL while rendering, so pages are rendered in worker
+# processes. The speedup plateaus at 4-6 workers.
+RENDER_MAX_WORKERS = min(os.cpu_count() or 1, 6)
+# Number of pages rendered by each worker task
+RENDER_PAGES_PER_TASK = 4
+# Threads encoding PNGs in each render worker, while the next page renders
+PNG_WRITE_WORKERS = 2
+
+def get_image_folder(pdf_path):
     """
-    Convert a PDF file to a series of high-resolution images.
+    Get the folder where the page images of a PDF file are stored.
 
     Args:
         pdf_path (str): Path to the PDF file
-        dpi (int): Resolution for the output images
 
     Returns:
-        str: Path to the folder containing the generated images
+        str: Path to the image folder, named after the PDF file
+    """
+    folder_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    return f"image/{folder_name}"
+
+def pixmap_to_array(pix):
+    """
+    Convert a PyMuPDF pixmap into a numpy array without encoding it.
+
+    Args:
+        pix (fitz.Pixmap): Rendered page
+
+    Returns:
+        numpy.ndarray: Array of shape (height, width, channels)
+    """
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+def write_png(image_path, img):
+    """
+    Save a rendered page as PNG.
+
+    OpenCV releases the GIL while encoding (unlike PyMuPDF's pix.save), so
+    this can run in a background thread while the next page is rendered.
+    The encoded PNG is written by numpy: cv2.imwrite can't open non-ASCII
+    paths on Windows.
+
+    Args:
+        image_path (str): Path of the PNG file to write
+        img (numpy.ndarray): RGB page array
+    """
+    ok, png = cv2.imencode('.png', cv2.cvtColor(img, cv2.COLOR_RGB2BGR))
+    if not ok:
+        raise ValueError(f"Não foi possível salvar a imagem {image_path}")
+    png.tofile(image_path)
+
+def render_page_range(pdf_path, first_page, last_page, dpi=300, return_arrays=True):
     """
+    Render a range of pages of a PDF file.
 
+    Every page is saved as PNG, which Label Studio serves, and by default
+    also returned as a numpy array so OCR can run without decoding the PNG
+    again. The PNGs are encoded in background threads.
+
+    This runs in the render worker processes, so every call opens its own
+    document: PyMuPDF documents can't be shared between processes.
+
+    Args:
+        pdf_path (str): Path to the PDF file
+        first_page (int): Index of the first page to render (0-based)
+        last_page (int): Index after the last page to render
+        dpi (int): Resolution for the output images
+        return_arrays (bool): Whether to return the page arrays along with
+            the image paths
+
+    Returns:
+        list: (image path, numpy array) tuple for each rendered page, or
+            just the image paths if return_arrays is False
+    """
     zoom = dpi/72  # Standard conversion from DPI to zoom factor
     magnify = fitz.Matrix(zoom, zoom)
+    output_folder = get_image_folder(pdf_path)
+
+    pages = []
+    with fitz.open(pdf_path) as doc, ThreadPoolExecutor(max_workers=PNG_WRITE_WORKERS) as png_pool:
+        writes = []
+        for page_num in range(first_page, last_page):
+            pix = doc[page_num].get_pixmap(matrix=magnify)
+            output_file = f"{output_folder}/page_{page_num + 1}.png"
+            img = pixmap_to_array(pix)
+
+            writes.append(png_pool.submit(write_png, output_file, img))
+            pages.append((output_file, img))
+
+        # Surface any failed write
+        for write, (output_file, _) in zip(writes, pages):
+            write.result()
+            print(f"Gerado: {output_file}")
+
+    if not return_arrays:
+        return [output_file for output_file, _ in pages]
+    return pages
+
+def split_page_ranges(pdf_path):
+    """
+    Split the pages of a PDF file into ranges of RENDER_PAGES_PER_TASK pages.
+
+    Args:
+        pdf_path (str): Path to the PDF file
+
+    Returns:
+        list: (first page, last page) tuples, as taken by render_page_range
+    """
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+
+    return [
+        (first_page, min(first_page + RENDER_PAGES_PER_TASK, page_count))
+        for first_page in range(0, page_count, RENDER_PAGES_PER_TASK)
+    ]
+
+def create_render_pool():
+    """
+    Create the process pool used to render PDF pages.
+
+    Workers are spawned rather than forked: forking while the OCR engine
+    threads are running can deadlock the child processes.
+
+    Returns:
+        ProcessPoolExecutor: Pool with RENDER_MAX_WORKERS workers
+    """
+    return ProcessPoolExecutor(
+        max_workers=RENDER_MAX_WORKERS,
+        mp_context=multiprocessing.get_context('spawn')
+    )
+
+def convert_pdf_to_images(pdf_path, dpi=300):
+    """
+    Convert a PDF file to a series of high-resolution images.
 
+    PDFs with more than RENDER_PAGES_PER_TASK pages are rendered in parallel
+    by a process pool.
+
+    Args:
+        pdf_path (str): Path to the PDF file
+        dpi (int): Resolution for the output images
+
+    Returns:
+        str: Path to the folder containing the generated images
+    """
     # Get the filename without extension for folder naming
-    folder_name = os.path.splitext(os.path.basename(pdf_path))[0]
-    output_folder = f"image/{folder_name}"
+    output_folder = get_image_folder(pdf_path)
 
     # Create output directory
     os.makedirs(output_folder, exist_ok=True)
 
-    # Open and process the PDF
-    doc = fitz.open(pdf_path)
-
-    for page_num, page in enumerate(doc, start=1):
-        pix = page.get_pixmap(matrix=magnify)
-        output_file = f"{output_folder}/page_{page_num}.png"
-        pix.save(output_file)
-        print(f"Gerado: {output_file}")
-
-    print(f"Convertidas {len(doc)} páginas de {pdf_path} para imagens em {output_folder}")
+    page_ranges = split_page_ranges(pdf_path)
+
+    # Only the image paths come back from the workers, so the pages are
+    # never all held in memory
+    if len(page_ranges) > 1:
+        with create_render_pool() as pool:
+            futures = [
+                pool.submit(render_page_range, pdf_path, first_page, last_page, dpi, False)
+                for first_page, last_page in page_ranges
+            ]
+            image_paths = [path for future in futures for path in future.result()]
+    else:
+        # Not worth starting worker processes for a few pages
+        image_paths = [
+            path
+            for first_page, last_page in page_ranges
+            for path in render_page_range(pdf_path, first_page, last_page, dpi, False)
+        ]
+
+    print(f"Convertidas {len(image_paths)} páginas de {pdf_path} para imagens em {output_folder}")
     return output_folder
 
 def create_image_url(image_path, base_folder="image"):
@@ -99,106 +242,287 @@ def create_image_url(image_path, base_folder="image"):
 
     return f'http://localhost:8080/{rel_path}'
 
-def create_lmv3_dataset(images_folder_path, output_filename=None, save_to_file=True):
+# Number of text crops per recognition forward pass (PaddleOCR default is 6)
+OCR_REC_BATCH_NUM = 16
+# Page shape used to warm up the OCR engine (A4 at 300 DPI)
+OCR_WARMUP_SHAPE = (3508, 2480, 3)
+
+def get_ocr_backend_options():
     """
-    Create a Label Studio compatible dataset from images using PaddleOCR.
+    Select the PaddleOCR inference backend.
+
+    The default Paddle Inference FP32 backend is used unless the environment
+    variable PPOCR_HPI=1 is set. When it is, the fastest backend available on
+    the machine is enabled:
+        - ONNX Runtime, if PPOCR_ONNX_DIR points to a folder with det.onnx and
+          rec.onnx models exported with paddle2onnx
+        - TensorRT with FP16 precision on GPU machines, with exhaustive cuDNN
+          convolution algorithm search for the layers TensorRT doesn't run
+        - MKL-DNN using all CPU cores otherwise
+
+    Returns:
+        dict: Extra keyword arguments for the PaddleOCR constructor
+    """
+    if os.environ.get('PPOCR_HPI') != '1':
+        return {}
+
+    import paddle
+
+    onnx_dir = os.environ.get('PPOCR_ONNX_DIR')
+    if onnx_dir:
+        return {
+            'use_onnx': True,
+            'det_model_dir': os.path.join(onnx_dir, 'det.onnx'),
+            'rec_model_dir': os.path.join(onnx_dir, 'rec.onnx')
+        }
+
+    if paddle.device.is_compiled_with_cuda() and paddle.device.cuda.device_count() > 0:
+        # cuDNN benchmarks every convolution algorithm on the first run of each
+        # input shape (the warmup) and reuses the fastest one afterwards
+        paddle.set_flags({'FLAGS_cudnn_exhaustive_search': True})
+        return {'use_tensorrt': True, 'precision': 'fp16', 'gpu_mem': 8000}
+
+    return {'enable_mkldnn': True, 'cpu_threads': os.cpu_count() or 1}
+
+def tune_onnx_sessions(ocr):
+    """
+    Recreate the ONNX Runtime CUDA sessions of the OCR engine with exhaustive
+    cuDNN convolution algorithm search.
+
+    PaddleOCR 2.x hard-codes cudnn_conv_algo_search=DEFAULT for these sessions.
+    With EXHAUSTIVE, the fastest algorithm is picked on the first run of each
+    input shape (the warmup) and reused for every page.
 
     Args:
-        images_folder_path (str): Path to the folder containing images
-        output_filename (str, optional): Filename for the output JSON. Default is based on folder name.
-        save_to_file (bool): Whether to save the results to a file or just return the data
+        ocr (PaddleOCR): OCR engine created with use_onnx=True on GPU
+    """
+    import onnxruntime as ort
+
+    sess_options = ort.SessionOptions()
+    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    providers = [(
+        "CUDAExecutionProvider",
+        {"device_id": ocr.args.gpu_id, "cudnn_conv_algo_search": "EXHAUSTIVE"}
+    )]
+
+    for predictor, model_path in (
+        (ocr.text_detector, ocr.args.det_model_dir),
+        (ocr.text_recognizer, ocr.args.rec_model_dir)
+    ):
+        session = ort.InferenceSession(model_path, sess_options, providers=providers)
+        predictor.predictor = session
+        predictor.input_tensor = session.get_inputs()[0]
+
+def create_ocr_engine():
+    """
+    Initialize the PaddleOCR engine and run a warmup pass.
+
+    Creating the engine allocates hundreds of MiB and takes seconds, so it is
+    created once per run and shared by every PDF.
 
     Returns:
-        tuple: (Path to the generated JSON file or None, list of tasks)
+        PaddleOCR: OCR engine ready to process pages
     """
+    # Imported here so the render worker processes don't load Paddle
+    from paddleocr import PaddleOCR
+
     print(f"Inicializando o motor PaddleOCR...")
-    # Initialize the OCR engine
+    # Recognition stays enabled: the detected text is exported to Label Studio.
+    # (PaddleOCR 2.x only accepts rec as an ocr() argument, so the rec=False
+    # previously passed here was silently ignored.)
     ocr = PaddleOCR(
         use_angle_cls=False,
         lang='en',
-        rec=False
+        rec_batch_num=OCR_REC_BATCH_NUM,
+        **get_ocr_backend_options()
     )
 
-    print(f"Processando imagens em {images_folder_path}...")
-    label_studio_task_list = []
+    if ocr.args.use_onnx and ocr.args.use_gpu:
+        tune_onnx_sessions(ocr)
 
-    # Process each image in the folder
-    for image_name in os.listdir(images_folder_path):
-        if not image_name.lower().endswith(('.png', '.jpg', '.jpeg')):
+    # Warm up detection and batched recognition so the first real pages
+    # don't pay for the lazy allocations of the inference backend (or for the
+    # cuDNN algorithm search). The warmup page has the shape of a rendered A4
+    # page, the most common input shape.
+    ocr.ocr(np.zeros(OCR_WARMUP_SHAPE, dtype=np.uint8), cls=False)
+    ocr.ocr([np.zeros((48, 320, 3), dtype=np.uint8)] * OCR_REC_BATCH_NUM, det=False, cls=False)
+
+    return ocr
+
+def ocr_page(ocr, image_path, img):
+    """
+    Run OCR on one page and convert the result into a Label Studio task.
+
+    Args:
+        ocr (PaddleOCR): OCR engine
+        image_path (str): Path to the image file
+        img (numpy.ndarray): Page image
+
+    Returns:
+        dict: Label Studio task with the OCR predictions
+    """
+    print(f"Processando imagem: {image_path}")
+    return build_label_studio_task(image_path, img, ocr.ocr(img, cls=False))
+
+# Source of the region IDs. Label Studio only needs them to be unique within a
+# task, and a counter avoids generating a random UUID for every detection.
+region_ids = itertools.count()
+
+def build_label_studio_task(image_path, img, result):
+    """
+    Convert the OCR result of one image into a Label Studio task.
+
+    Args:
+        image_path (str): Path to the image file
+        img (numpy.ndarray): Image the OCR was run on
+        result (list): PaddleOCR result for the image
+
+    Returns:
+        dict: Label Studio task with the OCR predictions
+    """
+    # Prepare the output JSON structure
+    output_json = {
+        'data': {"ocr": create_image_url(image_path)}
+    }
+    annotation_result = []
+
+    image_height, image_width = img.shape[:2]
+
+    # Image size, to convert pixels to percentages of it
+    dims = np.array([image_width, image_height], dtype=np.float64)
+
+    # Detections of all outputs, in order
+    items = [item for output in result if output for item in output]
+
+    # Calculate normalized bounding box values (as percentages) for all
+    # detections at once, slicing the top-left and bottom-right corners out
+    # of a single (N, 4, 2) array
+    coords = np.array([item[0] for item in items], dtype=np.float64).reshape(-1, 4, 2)
+    top_left = coords[:, 0, :]
+    size = coords[:, 2, :] - top_left
+    # Computed as 100 * value / dimension: value * (100 / dimension) rounds
+    # differently in the last bits
+    boxes = np.hstack((100 * top_left / dims, 100 * size / dims)).tolist()
+
+    # Process OCR results
+    for item, (x, y, width, height) in zip(items, boxes):
+        text = item[1][0]  # Detected text
+
+        # Skip empty text
+        if not text:
             continue
 
-        image_path = os.path.join(images_folder_path, image_name)
-        print(f"Processando imagem: {image_path}")
+        bbox = {
+            'x': x,
+            'y': y,
+            'width': width,
+            'height': height,
+            'rotation': 0
+        }
+
+        # Generate a unique ID for this detection
+        region_id = f"r{next(region_ids):09x}"
 
-        # Prepare the output JSON structure
-        output_json = {
-            'data': {"ocr": create_image_url(image_path)}
+        # Create annotation entries
+        bbox_result = {
+            'id': region_id,
+            'from_name': 'bbox',
+            'to_name': 'image',
+            'type': 'rectangle',
+            'value': bbox
         }
-        annotation_result = []
 
-        # Load and process the image
-        img = np.asarray(Image.open(image_path))
-        image_height, image_width = img.shape[:2]
+        transcription_result = {
+            'id': region_id,
+            'from_name': 'transcription',
+            'to_name': 'image',
+            'type': 'textarea',
+            'value': {
+                'text': [text],
+                'x': x,
+                'y': y,
+                'width': width,
+                'height': height,
+                'rotation': 0
+            },
+            'score': 0.5
+        }
 
-        # Perform OCR
-        result = ocr.ocr(img, cls=False)
+        # Add to annotation results
+        annotation_result.append(bbox_result)
+        annotation_result.append(transcription_result)
 
-        # Process OCR results
-        for output in result:
-            if output is None:
-                continue
+    # Add predictions to output
+    output_json['predictions'] = [{"result": annotation_result, "score": 0.97}]
+
+    return output_json
+
+# File extensions read from an images folder
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg'})
 
-            for item in output:
-                coords = item[0]  # Bounding box coordinates
-                text = item[1][0]  # Detected text
-
-                # Skip empty text
-                if not text:
-                    continue
-
-                # Calculate normalized bounding box values (as percentages)
-                x = coords[0][0]
-                y = coords[0][1]
-                width = coords[2][0] - coords[0][0]
-                height = coords[2][1] - coords[0][1]
-
-                bbox = {
-                    'x': 100 * x / image_width,
-                    'y': 100 * y / image_height,
-                    'width': 100 * width / image_width,
-                    'height': 100 * height / image_height,
-                    'rotation': 0
-                }
-
-                # Generate a unique ID for this detection
-                region_id = str(uuid4())[:10]
-
-                # Create annotation entries
-                bbox_result = {
-                    'id': region_id,
-                    'from_name': 'bbox',
-                    'to_name': 'image',
-                    'type': 'rectangle',
-                    'value': bbox
-                }
-
-                transcription_result = {
-                    'id': region_id,
-                    'from_name': 'transcription',
-                    'to_name': 'image',
-                    'type': 'textarea',
-                    'value': dict(text=[text], **bbox),
-                    'score': 0.5
-                }
-
-                # Add to annotation results
-                annotation_result.extend([bbox_result, transcription_result])
-
-        # Add predictions to output
-        output_json['predictions'] = [{"result": annotation_result, "score": 0.97}]
-
-        # Add to task list
-        label_studio_task_list.append(output_json)
+def read_image(image_path):
+    """
+    Read an image file into an RGB numpy array.
+
+    Args:
+        image_path (str): Path to the image file
+
+    Returns:
+        numpy.ndarray: Array of shape (height, width, 3), in the same channel
+            order as the pages rendered from the PDFs
+    """
+    # cv2.imread can't open non-ASCII paths on Windows (e.g. declaração.pdf
+    # pages), so the file is read by numpy and only decoded by OpenCV
+    img = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"Não foi possível ler a imagem {image_path}")
+
+    # OpenCV decodes to BGR
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+def load_images(images_folder_path):
+    """
+    Read the images of a folder, one at a time.
+
+    Args:
+        images_folder_path (str): Path to the folder containing images
+
+    Yields:
+        tuple: (image path, numpy array)
+    """
+    with os.scandir(images_folder_path) as entries:
+        image_paths = [
+            entry.path
+            for entry in entries
+            if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS and entry.is_file()
+        ]
+
+    for image_path in image_paths:
+        yield image_path, read_image(image_path)
+
+def create_lmv3_dataset(images_folder_path, output_filename=None, save_to_file=True, ocr=None):
+    """
+    Create a Label Studio compatible dataset from images using PaddleOCR.
+
+    Args:
+        images_folder_path (str): Path to the folder containing images
+        output_filename (str, optional): Filename for the output JSON. Default is based on folder name.
+        save_to_file (bool): Whether to save the results to a file or just return the data
+        ocr (PaddleOCR, optional): Shared OCR engine. Created if not provided.
+
+    Returns:
+        tuple: (Path to the generated JSON file or None, list of tasks)
+    """
+    # Initialize the OCR engine if none was shared
+    if ocr is None:
+        ocr = create_ocr_engine()
+
+    print(f"Processando imagens em {images_folder_path}...")
+    label_studio_task_list = []
+
+    # Process each image with the same OCR step as the PDF pipeline
+    for image_path, img in load_images(images_folder_path):
+        label_studio_task_list.append(ocr_page(ocr, image_path, img))
 
     # Save the results to a JSON file if requested
     if save_to_file:
@@ -208,8 +532,8 @@ def create_lmv3_dataset(images_folder_path, output_filename=None, save_to_file=T
             output_filename = f'{folder_name}_label-studio.json'
 
         # Save the results to a JSON file
-        with open(output_filename, 'w') as f:
-            json.dump(label_studio_task_list, f, indent=4)
+        with open(output_filename, 'wb') as f:
+            f.write(orjson.dumps(label_studio_task_list))
 
         print(f"Dataset para Label Studio criado com {len(label_studio_task_list)} imagens em {output_filename}")
         return output_filename, label_studio_task_list
@@ -217,13 +541,213 @@ def create_lmv3_dataset(images_folder_path, output_filename=None, save_to_file=T
         print(f"Processadas {len(label_studio_task_list)} imagens de {images_folder_path}")
         return None, label_studio_task_list
 
-def process_all_pdfs_in_folder(folder_path, output_json='label_studio_dataset.json'):
+# Maximum number of items waiting between two pipeline stages
+PIPELINE_QUEUE_SIZE = 4
+
+def pipeline_put(stage_queue, item, stop_event):
+    """
+    Put an item on a pipeline queue, giving up if the pipeline was stopped.
+
+    Args:
+        stage_queue (queue.Queue): Queue connecting two stages
+        item: Item to enqueue (None signals the end of the stream)
+        stop_event (threading.Event): Set when any stage fails
+
+    Returns:
+        bool: True if the item was enqueued
+    """
+    while not stop_event.is_set():
+        try:
+            stage_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def run_pipeline_stage(stage, errors, stop_event, *args):
+    """
+    Run a pipeline stage, recording its failure and stopping the other stages.
+    """
+    try:
+        stage(*args, stop_event)
+    except Exception as e:
+        errors.append(e)
+        stop_event.set()
+
+def render_pages_stage(pdf_files, pages_queue, dpi, stop_event):
+    """
+    Pipeline stage 1: render every page of the PDF files.
+
+    Page ranges of all PDFs are rendered by a process pool. Each page is
+    saved as PNG (served to Label Studio) and enqueued as an
+    (image_path, numpy array) tuple, so the OCR stage never decodes the PNG.
+    Ranges are enqueued as soon as they complete, in any order, so OCR can
+    batch pages of one PDF while the next ones are still rendering. At most
+    two tasks per worker are in flight to bound the memory held by pages.
+    """
+    def enqueue_pages(futures):
+        for future in futures:
+            for page in future.result():
+                if not pipeline_put(pages_queue, page, stop_event):
+                    return False
+        return True
+
+    try:
+        with create_render_pool() as pool:
+            pending = set()
+
+            for pdf_path in pdf_files:
+                print(f"\n{'='*50}")
+                print(f"Processando PDF: {pdf_path}")
+                print(f"{'='*50}")
+
+                os.makedirs(get_image_folder(pdf_path), exist_ok=True)
+
+                for first_page, last_page in split_page_ranges(pdf_path):
+                    pending.add(
+                        pool.submit(render_page_range, pdf_path, first_page, last_page, dpi)
+                    )
+
+                    if len(pending) >= 2 * RENDER_MAX_WORKERS:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        if not enqueue_pages(done):
+                            return
+
+            enqueue_pages(as_completed(pending))
+    finally:
+        pipeline_put(pages_queue, None, stop_event)
+
+def ocr_pages_stage(ocr, pages_queue, tasks_queue, stop_event):
+    """
+    Pipeline stage 2: run OCR on the rendered pages.
+
+    Each page is processed as soon as it arrives. PaddleOCR 2.x runs
+    detection one image at a time, so grouping pages would only keep them
+    in memory longer.
+    """
+    try:
+        while not stop_event.is_set():
+            try:
+                page = pages_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if page is None:
+                break
+
+            image_path, img = page
+            task = ocr_page(ocr, image_path, img)
+            if not pipeline_put(tasks_queue, task, stop_event):
+                return
+    finally:
+        pipeline_put(tasks_queue, None, stop_event)
+
+def write_tasks_stage(tasks_queue, output_json, stats, stop_event):
+    """
+    Pipeline stage 3: write the tasks to the JSON file as they are produced.
+
+    The JSON array is written one task at a time, so finished tasks don't
+    stay in memory. The array is only closed once the OCR stage signals the
+    end of the stream; if the pipeline is stopped, the file is left incomplete.
+    """
+    with open(output_json, 'wb') as f:
+        f.write(b'[')
+
+        while not stop_event.is_set():
+            try:
+                task = tasks_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if task is None:
+                f.write(b']')
+                return
+
+            if stats['tasks']:
+                f.write(b',\n')
+            f.write(orjson.dumps(task))
+            stats['tasks'] += 1
+
+def process_pdf_files(pdf_files, output_json, ocr=None, dpi=300):
+    """
+    Convert PDF files to images and create a single Label Studio dataset.
+
+    Rendering, OCR and JSON writing run in three threads connected by queues,
+    so the OCR engine keeps working while pages are rendered and written.
+    Memory doesn't grow with the number of pages, but the bound is not small:
+    while the OCR stage is busy, up to 2 * RENDER_MAX_WORKERS rendered ranges
+    of RENDER_PAGES_PER_TASK pages wait in the render stage, plus
+    PIPELINE_QUEUE_SIZE queued pages and the page under OCR. With 6 workers
+    that is 53 pages, about 1.4 GB for A4 pages at 300 DPI (~26 MB each).
+
+    The tasks are written to a temporary file, which only replaces output_json
+    once every PDF was processed: a failed or interrupted run keeps the
+    previous dataset.
+
+    Args:
+        pdf_files (list): Paths to the PDF files
+        output_json (str): Path for the combined JSON output
+        ocr (PaddleOCR, optional): Shared OCR engine. Created if not provided.
+        dpi (int): Resolution for the page images
+
+    Returns:
+        int: Number of tasks written to output_json
+    """
+    if ocr is None:
+        ocr = create_ocr_engine()
+
+    # Queues connecting render -> OCR -> write
+    pages_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    tasks_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    tmp_json = output_json + '.tmp'
+
+    stop_event = threading.Event()
+    errors = []
+    stats = {'tasks': 0}
+
+    stages = [
+        (render_pages_stage, (pdf_files, pages_queue, dpi)),
+        (ocr_pages_stage, (ocr, pages_queue, tasks_queue)),
+        (write_tasks_stage, (tasks_queue, tmp_json, stats)),
+    ]
+    threads = [
+        threading.Thread(target=run_pipeline_stage, args=(stage, errors, stop_event, *args))
+        for stage, args in stages
+    ]
+
+    for thread in threads:
+        thread.start()
+    try:
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            # Let the stages exit before propagating the interruption
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+            raise
+
+        if errors:
+            raise errors[0]
+
+        os.replace(tmp_json, output_json)
+    finally:
+        # Discard the partial output of a failed run
+        if os.path.exists(tmp_json):
+            os.remove(tmp_json)
+
+    return stats['tasks']
+
+def process_all_pdfs_in_folder(folder_path, output_json='label_studio_dataset.json', ocr=None, dpi=300):
     """
     Process all PDF files in a given folder.
 
     Args:
         folder_path (str): Path to the folder containing PDF files
         output_json (str): Path for the final combined JSON output
+        ocr (PaddleOCR, optional): Shared OCR engine. Created if not provided.
+        dpi (int): Resolution for the page images
 
     Returns:
         str: Path to the combined JSON file
@@ -238,30 +762,9 @@ def process_all_pdfs_in_folder(folder_path, output_json='label_studio_dataset.js
 
     print(f"Encontrados {len(pdf_files)} arquivos PDF para processar")
 
-    # Lists to track processed data
-    image_folders = []
-    all_tasks = []
-
-    # Process each PDF file
-    for pdf_path in pdf_files:
-        print(f"\n{'='*50}")
-        print(f"Processando PDF: {pdf_path}")
-        print(f"{'='*50}")
-
-        # Convert PDF to images
-        image_folder = convert_pdf_to_images(pdf_path)
-        image_folders.append(image_folder)
+    task_count = process_pdf_files(pdf_files, output_json, ocr=ocr, dpi=dpi)
 
-        # Create dataset for this PDF without saving individual files
-        _, pdf_tasks = create_lmv3_dataset(image_folder, save_to_file=False)
-        all_tasks.extend(pdf_tasks)
-
-    # Save all tasks into a single dataset
-    print(f"\nSalvando dataset combinado final...")
-    with open(output_json, 'w') as f:
-        json.dump(all_tasks, f, indent=4)
-
-    print(f"Dataset combinado com {len(all_tasks)} imagens totais salvo em {output_json}")
+    print(f"Dataset combinado com {task_count} imagens totais salvo em {output_json}")
     return output_json
 
 def main():
@@ -274,6 +777,9 @@ def main():
     else:
         path = "pdfs/"  # Default to a folder instead of a single file
 
+    # Each branch creates the OCR engine once, shared by every PDF, and only
+    # after checking there is something to process
+
     # Check if the path is a directory or a file
     if os.path.isdir(path):
         print(f"Processando todos os PDFs na pasta: {path}")
@@ -284,9 +790,16 @@ def main():
             print(f"Dataset combinado do Label Studio criado: {json_file}")
     else:
         # Process single PDF file
+        if not os.path.isfile(path):
+            print(f"Arquivo PDF não encontrado: {path}")
+            return
+
         print(f"Processando PDF único: {path}")
-        image_folder = convert_pdf_to_images(path)
-        json_file, _ = create_lmv3_dataset(image_folder)
+        image_folder = get_image_folder(path)
+        json_file = f'{os.path.basename(image_folder)}_label-studio.json'
+        task_count = process_pdf_files([path], json_file)
+
+        print(f"Dataset para Label Studio criado com {task_count} imagens em {json_file}")
 
         print("\nFluxo de trabalho concluído com sucesso!")
         print(f"PDF convertido para imagens: {image_folder}")
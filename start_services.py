@@ -2,7 +2,7 @@
 import subprocess
 import time
 import threading
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 
 # HTTP server class with CORS support
 class CORSRequestHandler(SimpleHTTPRequestHandler):
@@ -10,10 +10,17 @@ class CORSRequestHandler(SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         SimpleHTTPRequestHandler.end_headers(self)
 
+    # Send files with socket.sendfile, which copies them from the page cache
+    # to the socket without going through Python (os.sendfile when available)
+    def copyfile(self, source, outputfile):
+        outputfile.flush()
+        self.connection.sendfile(source)
+
 # Function to run the HTTP server in a separate thread
+# (each request is handled in its own thread, so image fetches don't queue up)
 def run_http_server(port=8080):
     server_address = ('', port)
-    httpd = HTTPServer(server_address, CORSRequestHandler)
+    httpd = ThreadingHTTPServer(server_address, CORSRequestHandler)
     print(f"Servidor HTTP iniciado na porta {port}")
     httpd.serve_forever()
 